@@ -64,6 +64,25 @@ class BaseOptimizer(ABC, Optimizer):
                     elif pre_zero:
                         state[p]['hessian'].zero_()
 
+    @staticmethod
+    def zero_state(
+        state: STATE, key: str, shape: Tuple[int, ...], dtype: torch.dtype, device: torch.device
+    ) -> torch.Tensor:
+        r"""Zero-out the state in-place if it exists, otherwise allocate it. It avoids re-allocation when resetting.
+
+        :param state: STATE. state of the parameter.
+        :param key: str. name of the state.
+        :param shape: Tuple[int, ...]. shape of the state.
+        :param dtype: torch.dtype. dtype of the state.
+        :param device: torch.device. device of the state.
+        """
+        buffer = state.get(key)
+        if buffer is not None and buffer.shape == shape and buffer.dtype == dtype and buffer.device == device:
+            return buffer.zero_()
+
+        state[key] = torch.zeros(shape, dtype=dtype, device=device)
+        return state[key]
+
     @staticmethod
     @torch.no_grad()
     def compute_hutchinson_hessian(
@@ -245,15 +264,18 @@ class BaseOptimizer(ABC, Optimizer):
         return x.norm(2) / math.sqrt(x.numel())
 
     @staticmethod
-    def approximate_sq_grad(
-        exp_avg_sq_row: torch.Tensor,
-        exp_avg_sq_col: torch.Tensor,
-        output: torch.Tensor,
-    ) -> None:
-        r"""Get approximation of EMA of squared gradient."""
-        r_factor: torch.Tensor = (exp_avg_sq_row / exp_avg_sq_row.mean(dim=-1, keepdim=True)).rsqrt_().unsqueeze(-1)
+    def approximate_sq_grad(exp_avg_sq_row: torch.Tensor, exp_avg_sq_col: torch.Tensor) -> torch.Tensor:
+        r"""Get approximation of EMA of squared gradient.
+
+        It returns a new tensor instead of writing to the given one, so `torch.compile` can fuse it into a single
+        kernel which only reads the row & column factors.
+
+        :param exp_avg_sq_row: torch.Tensor. row factor of the EMA of squared gradient.
+        :param exp_avg_sq_col: torch.Tensor. column factor of the EMA of squared gradient.
+        """
+        r_factor: torch.Tensor = (exp_avg_sq_row / exp_avg_sq_row.mean(dim=-1, keepdim=True)).rsqrt().unsqueeze(-1)
         c_factor: torch.Tensor = exp_avg_sq_col.unsqueeze(-2).rsqrt()
-        torch.mul(r_factor, c_factor, out=output)
+        return r_factor * c_factor
 
     @staticmethod
     def apply_cautious(update: torch.Tensor, grad: torch.Tensor) -> None:
@@ -1,5 +1,5 @@
 import math
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple, Union
 
 import torch
 
@@ -8,6 +8,65 @@ from pytorch_optimizer.base.optimizer import BaseOptimizer
 from pytorch_optimizer.base.types import BETAS, CLOSURE, DEFAULTS, LOSS, PARAMETERS
 
 
+def clip_update(
+    update: torch.Tensor,
+    grad: torch.Tensor,
+    exp_avg_sq_hat: Optional[torch.Tensor],
+    beta2_t: Union[float, torch.Tensor],
+    clip_threshold: float,
+) -> torch.Tensor:
+    r"""Apply AMSBound (if `exp_avg_sq_hat` is given), scale by the gradient and clip the update by its RMS."""
+    if exp_avg_sq_hat is not None:
+        update.reciprocal_()
+        torch.max(exp_avg_sq_hat, update, out=exp_avg_sq_hat)
+        torch.rsqrt(exp_avg_sq_hat, out=update).mul_(beta2_t ** 0.5)  # fmt: skip
+
+    update.mul_(grad)
+
+    return update.div_((BaseOptimizer.get_rms(update) / clip_threshold).clamp_(min=1.0))
+
+
+def factored_update(
+    grad: torch.Tensor,
+    exp_avg_sq_row: torch.Tensor,
+    exp_avg_sq_col: torch.Tensor,
+    exp_avg_sq_hat: Optional[torch.Tensor],
+    beta2_t: Union[float, torch.Tensor],
+    eps1: float,
+    clip_threshold: float,
+) -> torch.Tensor:
+    r"""Get AdaFactor update for the factored (2D+) parameter. Row & column factors are updated in-place."""
+    grad_sq = torch.mul(grad, grad)
+
+    # mean(grad^2 + eps1) == mean(grad^2) + eps1, so add eps1 to the (smaller) reduced tensors
+    exp_avg_sq_row.mul_(beta2_t).add_(grad_sq.mean(dim=-1).add_(eps1).mul_(1.0 - beta2_t))
+    exp_avg_sq_col.mul_(beta2_t).add_(grad_sq.mean(dim=-2).add_(eps1).mul_(1.0 - beta2_t))
+
+    update = BaseOptimizer.approximate_sq_grad(exp_avg_sq_row, exp_avg_sq_col)
+
+    return clip_update(update, grad, exp_avg_sq_hat, beta2_t, clip_threshold)
+
+
+def non_factored_update(
+    grad: torch.Tensor,
+    exp_avg_sq: torch.Tensor,
+    exp_avg_sq_hat: Optional[torch.Tensor],
+    beta2: float,
+    beta2_t: Union[float, torch.Tensor],
+    eps1: float,
+    clip_threshold: float,
+) -> torch.Tensor:
+    r"""Get AdaFactor update for the non-factored (1D) parameter. `exp_avg_sq` is updated in-place."""
+    update = torch.mul(grad, grad).add_(eps1)
+
+    exp_avg_sq.mul_(beta2_t).add_(update.mul_(1.0 - beta2_t))
+    exp_avg_sq.clamp_(max=beta2)
+
+    torch.rsqrt(exp_avg_sq, out=update)
+
+    return clip_update(update, grad, exp_avg_sq_hat, beta2_t, clip_threshold)
+
+
 class AdaFactor(BaseOptimizer):
     r"""Adaptive Learning Rates with Sublinear Memory Cost with some tweaks.
 
@@ -31,6 +90,13 @@ class AdaFactor(BaseOptimizer):
         half-precision (bfloat16 type) does not affect training dynamics and has no effect on the outcome while
         reducing optimize overhead from 2-fold to 1.5-fold.
     :param cautious: bool. whether to use the Cautious variant.
+    :param foreach: bool. whether to subtract the momentum from the parameters w/ the multi-tensor (foreach)
+        operation. if False, it is applied to the parameters one by one. only the parameters whose dtype matches
+        `momentum_dtype` are batched since the mixed-dtype foreach operation has no fast path.
+    :param use_compile: bool. whether to `torch.compile` the per-parameter update to fuse the element-wise operations.
+        it takes some time to compile at the first few steps. requires PyTorch 2.0 or later. `step` is kept as a
+        tensor on the device, so the step-dependent terms don't trigger the re-compilation. on CPU, the update is
+        compiled into the vectorized C++/OpenMP kernels.
     """
 
     def __init__(
@@ -51,6 +117,8 @@ class AdaFactor(BaseOptimizer):
         eps2: float = 1e-3,
         momentum_dtype: torch.dtype = torch.bfloat16,
         cautious: bool = False,
+        foreach: bool = True,
+        use_compile: bool = False,
         **kwargs,
     ):
         self.validate_learning_rate(lr)
@@ -65,6 +133,16 @@ class AdaFactor(BaseOptimizer):
         self.eps2 = eps2
         self.momentum_dtype = momentum_dtype
         self.cautious = cautious
+        self.use_compile = use_compile
+
+        self.factored_update = factored_update
+        self.non_factored_update = non_factored_update
+        if use_compile:
+            if not hasattr(torch, 'compile'):
+                raise ValueError('[-] use_compile requires PyTorch 2.0 or later.')
+
+            self.factored_update = torch.compile(factored_update, fullgraph=True)
+            self.non_factored_update = torch.compile(non_factored_update, fullgraph=True)
 
         defaults: DEFAULTS = {
             'lr': lr,
@@ -78,50 +156,103 @@ class AdaFactor(BaseOptimizer):
             'warmup_init': warmup_init,
             'eps1': eps1,
             'eps2': eps2,
+            'foreach': foreach,
         }
         super().__init__(params, defaults)
 
+        self.cuda_graph: Optional[torch.cuda.CUDAGraph] = None
+
     def __str__(self) -> str:
         return 'AdaFactor'
 
     @torch.no_grad()
     def reset(self):
         for group in self.param_groups:
-            group['step'] = 0
+            if torch.is_tensor(group.get('step')):
+                # reset in-place, so the captured CUDA graph keeps pointing to the same tensor
+                group['step'].zero_()
+            else:
+                group['step'] = self.init_step(group)
+
             for p in group['params']:
-                state = self.state[p]
+                self.init_state(self.state[p], group, p, p.grad)
 
-                grad = p.grad
+    @torch.no_grad()
+    def capture_step(self) -> None:
+        r"""Record the optimizer step into a CUDA graph. After that, `step()` replays the graph.
+
+        Run `step()` a few times before capturing to initialize the states (it raises `ValueError` otherwise), and keep
+        the gradients at the same memory addresses (e.g. `zero_grad(set_to_none=False)`). `step` of each group is
+        moved to the device, so the step-dependent terms are computed in the graph. The other hyper-parameters like
+        `lr` are recorded into the graph, so re-capture it after changing them or loading a state dict. `reset()`
+        zeroes the states in-place, so the graph stays valid after it.
+        """
+        for group in self.param_groups:
+            if 'step' not in group or any(p.grad is not None and len(self.state[p]) == 0 for p in group['params']):
+                raise ValueError('[-] run step() before capture_step() to initialize the states.')
 
-                grad_shape: Tuple[int, ...] = grad.shape
-                factored: bool = self.get_options(grad_shape)
+        self.cuda_graph = None
 
-                if group['betas'][0] is not None:
-                    state['exp_avg'] = torch.zeros_like(p, dtype=self.momentum_dtype)
+        for group in self.param_groups:
+            if not torch.is_tensor(group['step']):
+                group['step'] = torch.tensor(float(group['step']), device=group['params'][0].device)
 
-                if factored:
-                    state['exp_avg_sq_row'] = torch.zeros(grad_shape[:-1], dtype=grad.dtype, device=grad.device)
-                    state['exp_avg_sq_col'] = torch.zeros(
-                        grad_shape[:-2] + grad_shape[-1:], dtype=grad.dtype, device=grad.device
-                    )
-                else:
-                    state['exp_avg_sq'] = torch.zeros_like(grad)
+        graph = torch.cuda.CUDAGraph()  # pragma: no cover
+        with torch.cuda.graph(graph):  # pragma: no cover
+            self.step()
+
+        self.cuda_graph = graph  # pragma: no cover
+
+    def init_step(self, group) -> Union[int, torch.Tensor]:
+        r"""Get the initial `step`.
+
+        It is a 0-d tensor on the device w/ `use_compile`, so it can be updated in-graph.
+        """
+        if self.use_compile:
+            return torch.zeros((), dtype=torch.float32, device=group['params'][0].device)
+        return 0
 
-                if group['ams_bound']:
-                    state['exp_avg_sq_hat'] = torch.zeros_like(grad)
+    def init_state(self, state, group, p: torch.Tensor, grad: torch.Tensor) -> None:
+        r"""Initialize the states of the parameter. the existing buffers are zeroed-out in-place."""
+        grad_shape: Tuple[int, ...] = grad.shape
 
-                state['RMS'] = 0.0
+        if group['betas'][0] is not None:
+            self.zero_state(state, 'exp_avg', p.shape, self.momentum_dtype, p.device)
+
+        if self.get_options(grad_shape):
+            self.zero_state(state, 'exp_avg_sq_row', grad_shape[:-1], grad.dtype, grad.device)
+            self.zero_state(state, 'exp_avg_sq_col', grad_shape[:-2] + grad_shape[-1:], grad.dtype, grad.device)
+        else:
+            self.zero_state(state, 'exp_avg_sq', grad_shape, grad.dtype, grad.device)
+
+        if group['ams_bound']:
+            self.zero_state(state, 'exp_avg_sq_hat', grad_shape, grad.dtype, grad.device)
+
+        state['RMS'] = 0.0
 
     def get_lr(
-        self, lr: float, step: int, rms: float, relative_step: bool, warmup_init: bool, scale_parameter: bool
-    ) -> float:
-        r"""Get AdaFactor learning rate."""
-        relative_step_size: float = lr
+        self,
+        lr: float,
+        step: Union[int, torch.Tensor],
+        rms: Union[float, torch.Tensor],
+        relative_step: bool,
+        warmup_init: bool,
+        scale_parameter: bool,
+    ) -> Union[float, torch.Tensor]:
+        r"""Get AdaFactor learning rate. `step` and `rms` can be tensors not to synchronize with the host."""
+        relative_step_size: Union[float, torch.Tensor] = lr
         if relative_step:
-            min_step: float = 1e-6 * step if warmup_init else 1e-2
-            relative_step_size = min(min_step, 1.0 / math.sqrt(step))
-
-        param_scale: float = 1.0 if scale_parameter else max(self.eps2, rms)
+            min_step: Union[float, torch.Tensor] = 1e-6 * step if warmup_init else 1e-2
+            relative_step_size = (
+                torch.clamp(step.rsqrt(), max=min_step)
+                if torch.is_tensor(step)
+                else min(min_step, 1.0 / math.sqrt(step))
+            )
+
+        if scale_parameter:
+            param_scale: Union[float, torch.Tensor] = 1.0
+        else:
+            param_scale = torch.clamp(rms, min=self.eps2) if torch.is_tensor(rms) else max(self.eps2, rms)
 
         return param_scale * relative_step_size
 
@@ -137,15 +268,34 @@ class AdaFactor(BaseOptimizer):
             with torch.enable_grad():
                 loss = closure()
 
+        if self.cuda_graph is not None:  # pragma: no cover
+            self.cuda_graph.replay()
+            return loss
+
         for group in self.param_groups:
-            if 'step' in group:
-                group['step'] += 1
-            else:
-                group['step'] = 1
+            if 'step' not in group:
+                group['step'] = self.init_step(group)
+
+            group['step'] += 1
 
             beta1, beta2 = group['betas']
 
-            beta2_t: float = 1.0 - math.pow(group['step'], self.decay_rate)
+            beta2_t: Union[float, torch.Tensor] = 1.0 - group['step'] ** self.decay_rate  # fmt: skip
+
+            params: List[torch.Tensor] = []
+            exp_avgs: List[torch.Tensor] = []
+
+            # w/ `scale_parameter`, the learning rate doesn't depend on the parameter. so, compute it once per group
+            group_lr: Optional[Union[float, torch.Tensor]] = None
+            if group['scale_parameter']:
+                group_lr = self.get_lr(
+                    lr=group['lr'],
+                    step=group['step'],
+                    rms=0.0,
+                    relative_step=group['relative_step'],
+                    warmup_init=group['warmup_init'],
+                    scale_parameter=True,
+                )
 
             for p in group['params']:
                 if p.grad is None:
@@ -161,65 +311,39 @@ class AdaFactor(BaseOptimizer):
                 factored: bool = self.get_options(grad_shape)
 
                 if len(state) == 0:
-                    if beta1 is not None:
-                        state['exp_avg'] = torch.zeros_like(p, dtype=self.momentum_dtype)
-
-                    if factored:
-                        state['exp_avg_sq_row'] = torch.zeros(grad_shape[:-1], dtype=grad.dtype, device=grad.device)
-                        state['exp_avg_sq_col'] = torch.zeros(
-                            grad_shape[:-2] + grad_shape[-1:], dtype=grad.dtype, device=grad.device
-                        )
-                    else:
-                        state['exp_avg_sq'] = torch.zeros_like(grad)
-
-                    if group['ams_bound']:
-                        state['exp_avg_sq_hat'] = torch.zeros_like(grad)
-
-                    state['RMS'] = 0.0
-
-                state['RMS'] = self.get_rms(p)
-
-                lr: float = self.get_lr(
-                    lr=group['lr'],
-                    step=group['step'],
-                    rms=state['RMS'],
-                    relative_step=group['relative_step'],
-                    warmup_init=group['warmup_init'],
-                    scale_parameter=group['scale_parameter'],
-                )
+                    self.init_state(state, group, p, grad)
+
+                lr: Union[float, torch.Tensor] = group_lr
+                if not group['scale_parameter']:
+                    state['RMS'] = self.get_rms(p)
+
+                    lr = self.get_lr(
+                        lr=group['lr'],
+                        step=group['step'],
+                        rms=state['RMS'],
+                        relative_step=group['relative_step'],
+                        warmup_init=group['warmup_init'],
+                        scale_parameter=False,
+                    )
 
-                update = torch.mul(grad, grad).add_(self.eps1)
+                exp_avg_sq_hat: Optional[torch.Tensor] = state['exp_avg_sq_hat'] if group['ams_bound'] else None
 
                 if factored:
-                    exp_avg_sq_row, exp_avg_sq_col = state['exp_avg_sq_row'], state['exp_avg_sq_col']
-
-                    exp_avg_sq_row.mul_(beta2_t).add_(update.mean(dim=-1), alpha=1.0 - beta2_t)
-                    exp_avg_sq_col.mul_(beta2_t).add_(update.mean(dim=-2), alpha=1.0 - beta2_t)
-
-                    self.approximate_sq_grad(exp_avg_sq_row, exp_avg_sq_col, update)
+                    update = self.factored_update(
+                        grad,
+                        state['exp_avg_sq_row'],
+                        state['exp_avg_sq_col'],
+                        exp_avg_sq_hat,
+                        beta2_t,
+                        self.eps1,
+                        self.clip_threshold,
+                    )
                 else:
-                    exp_avg_sq = state['exp_avg_sq']
-                    exp_avg_sq.mul_(beta2_t).add_(update, alpha=1.0 - beta2_t)
-                    exp_avg_sq.clamp_(max=beta2)
-
-                    torch.rsqrt(exp_avg_sq, out=update)
-
-                if group['ams_bound']:
-                    exp_avg_sq_hat = state['exp_avg_sq_hat']
-                    torch.max(exp_avg_sq_hat, 1 / update, out=exp_avg_sq_hat)
-                    torch.rsqrt(exp_avg_sq_hat / beta2_t, out=update)
-
-                update.mul_(grad)
-
-                update.div_((self.get_rms(update) / self.clip_threshold).clamp_(min=1.0)).mul_(lr)
-
-                if beta1 is not None:
-                    exp_avg = state['exp_avg']
-                    exp_avg.mul_(beta1).add_(update, alpha=1.0 - beta1)
+                    update = self.non_factored_update(
+                        grad, state['exp_avg_sq'], exp_avg_sq_hat, beta2, beta2_t, self.eps1, self.clip_threshold
+                    )
 
-                    update = exp_avg.clone()
-                    if self.cautious:
-                        self.apply_cautious(update, grad)
+                update.mul_(lr)
 
                 self.apply_weight_decay(
                     p=p,
@@ -230,6 +354,23 @@ class AdaFactor(BaseOptimizer):
                     fixed_decay=group['fixed_decay'],
                 )
 
+                if beta1 is not None:
+                    exp_avg = state['exp_avg']
+                    exp_avg.mul_(beta1).add_(update, alpha=1.0 - beta1)
+
+                    if group['foreach'] and not self.cautious and exp_avg.dtype == p.dtype:
+                        # the parameters are updated by `exp_avg` itself, so it's deferred w/o keeping `update` alive
+                        params.append(p)
+                        exp_avgs.append(exp_avg)
+                        continue
+
+                    update = exp_avg.clone()
+                    if self.cautious:
+                        self.apply_cautious(update, grad)
+
                 p.add_(-update)
 
+            if len(params) > 0:
+                torch._foreach_sub_(params, exp_avgs)
+
         return loss
@@ -103,17 +103,6 @@ class CAME(BaseOptimizer):
         r"""Get RMS."""
         return x.norm(2) / math.sqrt(x.numel())
 
-    @staticmethod
-    def approximate_sq_grad(
-        exp_avg_sq_row: torch.Tensor,
-        exp_avg_sq_col: torch.Tensor,
-        output: torch.Tensor,
-    ):
-        r"""Get approximation of EMA of squared gradient."""
-        r_factor: torch.Tensor = (exp_avg_sq_row / exp_avg_sq_row.mean(dim=-1, keepdim=True)).rsqrt_().unsqueeze(-1)
-        c_factor: torch.Tensor = exp_avg_sq_col.unsqueeze(-2).rsqrt()
-        torch.mul(r_factor, c_factor, out=output)
-
     @torch.no_grad()
     def step(self, closure: CLOSURE = None) -> LOSS:
         loss: LOSS = None
@@ -172,7 +161,7 @@ class CAME(BaseOptimizer):
                     exp_avg_sq_row.mul_(beta2).add_(update.mean(dim=-1), alpha=1.0 - beta2)
                     exp_avg_sq_col.mul_(beta2).add_(update.mean(dim=-2), alpha=1.0 - beta2)
 
-                    self.approximate_sq_grad(exp_avg_sq_row, exp_avg_sq_col, update)
+                    update = self.approximate_sq_grad(exp_avg_sq_row, exp_avg_sq_col)
                 else:
                     exp_avg_sq = state['exp_avg_sq']
                     exp_avg_sq.mul_(beta2).add_(update, alpha=1.0 - beta2)
@@ -199,7 +188,7 @@ class CAME(BaseOptimizer):
                     exp_avg_res_row.mul_(beta3).add_(res.mean(dim=-1), alpha=1.0 - beta3)
                     exp_avg_res_col.mul_(beta3).add_(res.mean(dim=-2), alpha=1.0 - beta3)
 
-                    self.approximate_sq_grad(exp_avg_res_row, exp_avg_res_col, update)
+                    update = self.approximate_sq_grad(exp_avg_res_row, exp_avg_res_col)
                     update.mul_(exp_avg)
                 else:
                     update = exp_avg
@@ -1,8 +1,47 @@
+from typing import Dict, List, Optional, Tuple
+
 import torch
 
 from pytorch_optimizer.base.exception import NoSparseGradientError
 from pytorch_optimizer.base.optimizer import BaseOptimizer
 from pytorch_optimizer.base.types import CLOSURE, DEFAULTS, LOSS, PARAMETERS
+from pytorch_optimizer.optimizer.utils import TORCH_VERSION_AT_LEAST_1_13
+
+
+def scale_by_trust_ratio(
+    params: List[torch.Tensor], grads: List[torch.Tensor], weight_decay: float, trust_coefficient: float
+) -> None:
+    r"""Add weight decay to the gradients and scale them by the layer-wise trust ratios in-place."""
+    param_norms = torch.stack(torch._foreach_norm(params))
+    update_norms = torch.stack(torch._foreach_norm(grads))
+
+    # norms are non-negative, so the ratio falls back to 1 when either of them is zero
+    trust_ratios = param_norms.div(update_norms).mul_(trust_coefficient)
+    trust_ratios.masked_fill_(torch.minimum(param_norms, update_norms) == 0.0, 1.0)
+
+    torch._foreach_add_(grads, params, alpha=weight_decay)
+    torch._foreach_mul_(grads, trust_ratios.unbind(0))
+
+
+def get_momentum_updates(
+    grads: List[torch.Tensor],
+    momentum_buffers: List[torch.Tensor],
+    momentum: float,
+    dampening: float,
+    nesterov: bool,
+) -> List[torch.Tensor]:
+    r"""Update the momentum buffers (if given) in-place and return the updates to apply to the parameters."""
+    updates: List[torch.Tensor] = grads
+    if len(momentum_buffers) > 0:
+        torch._foreach_mul_(momentum_buffers, momentum)
+        torch._foreach_add_(momentum_buffers, grads, alpha=1.0 - dampening)
+
+        if nesterov:
+            torch._foreach_add_(grads, momentum_buffers, alpha=momentum)
+        else:
+            updates = momentum_buffers
+
+    return updates
 
 
 class LARS(BaseOptimizer):
@@ -15,6 +54,11 @@ class LARS(BaseOptimizer):
     :param dampening: float. dampening for momentum.
     :param trust_coefficient: float. trust_coefficient.
     :param nesterov: bool. enables nesterov momentum.
+    :param foreach: bool. whether to use the multi-tensor (foreach) implementation. if False, the parameters are
+        updated one by one. they are always updated one by one on PyTorch < 1.13, which lacks `torch._foreach_norm`.
+    :param use_compile: bool. whether to `torch.compile` the update to fuse the weight decay, trust ratio scaling,
+        momentum and parameter update into fewer kernels. it takes some time to compile at the first few steps.
+        requires PyTorch 2.0 or later. it only applies to the foreach implementation.
     """
 
     def __init__(
@@ -26,6 +70,8 @@ class LARS(BaseOptimizer):
         dampening: float = 0.0,
         trust_coefficient: float = 1e-3,
         nesterov: bool = False,
+        foreach: bool = True,
+        use_compile: bool = False,
         **kwargs,
     ):
         self.validate_learning_rate(lr)
@@ -34,6 +80,15 @@ class LARS(BaseOptimizer):
         self.validate_range(dampening, 'dampening', 0.0, 1.0)
         self.validate_non_negative(trust_coefficient, 'trust_coefficient')
 
+        self.scale_by_trust_ratio = scale_by_trust_ratio
+        self.get_momentum_updates = get_momentum_updates
+        if use_compile:
+            if not hasattr(torch, 'compile'):
+                raise ValueError('[-] use_compile requires PyTorch 2.0 or later.')
+
+            self.scale_by_trust_ratio = torch.compile(scale_by_trust_ratio, fullgraph=True)
+            self.get_momentum_updates = torch.compile(get_momentum_updates, fullgraph=True)
+
         defaults: DEFAULTS = {
             'lr': lr,
             'weight_decay': weight_decay,
@@ -41,9 +96,12 @@ class LARS(BaseOptimizer):
             'dampening': dampening,
             'trust_coefficient': trust_coefficient,
             'nesterov': nesterov,
+            'foreach': foreach,
         }
         super().__init__(params, defaults)
 
+        self.cuda_graph: Optional[torch.cuda.CUDAGraph] = None
+
     def __str__(self) -> str:
         return 'Lars'
 
@@ -55,6 +113,73 @@ class LARS(BaseOptimizer):
 
                 state['mu'] = torch.zeros_like(p)
 
+    @torch.no_grad()
+    def capture_step(self) -> None:
+        r"""Record the optimizer step into a CUDA graph. After that, `step()` replays the graph.
+
+        Run `step()` a few times before capturing to initialize the momentum buffers (it raises `ValueError`
+        otherwise), and keep the gradients at the same memory addresses (e.g. `zero_grad(set_to_none=False)`). The
+        hyper-parameters like `lr` are recorded into the graph, so re-capture it after changing them or loading a
+        state dict.
+        """
+        for group in self.param_groups:
+            for p in group['params']:
+                if p.grad is not None and group['momentum'] > 0.0 and 'momentum_buffer' not in self.state[p]:
+                    raise ValueError('[-] run step() before capture_step() to initialize the momentum buffers.')
+
+        self.cuda_graph = None
+
+        graph = torch.cuda.CUDAGraph()  # pragma: no cover
+        with torch.cuda.graph(graph):  # pragma: no cover
+            self.step()
+
+        self.cuda_graph = graph  # pragma: no cover
+
+    @staticmethod
+    def group_tensors(
+        params: List[torch.Tensor], grads: List[torch.Tensor]
+    ) -> Dict[Tuple[torch.device, torch.dtype, bool], Tuple[List[torch.Tensor], List[torch.Tensor]]]:
+        r"""Bucket parameters and gradients by (device, dtype, ndim > 1) for the multi-tensor (foreach) kernels."""
+        buckets: Dict[Tuple[torch.device, torch.dtype, bool], Tuple[List[torch.Tensor], List[torch.Tensor]]] = {}
+        for p, grad in zip(params, grads):
+            bucket = buckets.setdefault((p.device, p.dtype, p.ndim > 1), ([], []))
+            bucket[0].append(p)
+            bucket[1].append(grad)
+
+        return buckets
+
+    def update_single_tensor(self, group, p: torch.Tensor, grad: torch.Tensor) -> None:
+        r"""Update the parameter w/o the multi-tensor operations."""
+        if p.ndim > 1:  # if not normalization gamma/beta or bias
+            param_norm = torch.linalg.norm(p)
+            update_norm = torch.linalg.norm(grad)
+
+            one = torch.ones_like(param_norm)
+
+            trust_ratio = torch.where(
+                param_norm > 0.0,
+                torch.where(update_norm > 0.0, (group['trust_coefficient'] * param_norm / update_norm), one),
+                one,
+            )
+
+            grad.add_(p, alpha=group['weight_decay'])
+            grad.mul_(trust_ratio)
+
+        if group['momentum'] > 0.0:
+            state = self.state[p]
+            if 'momentum_buffer' not in state:
+                state['momentum_buffer'] = grad.clone().detach()
+
+            mb = state['momentum_buffer']
+            mb.mul_(group['momentum']).add_(grad, alpha=1.0 - group['dampening'])
+
+            if group['nesterov']:
+                grad.add_(mb, alpha=group['momentum'])
+            else:
+                grad.copy_(mb)
+
+        p.add_(grad, alpha=-group['lr'])
+
     @torch.no_grad()
     def step(self, closure: CLOSURE = None) -> LOSS:
         loss: LOSS = None
@@ -62,43 +187,48 @@ class LARS(BaseOptimizer):
             with torch.enable_grad():
                 loss = closure()
 
+        if self.cuda_graph is not None:  # pragma: no cover
+            self.cuda_graph.replay()
+            return loss
+
         for group in self.param_groups:
+            params: List[torch.Tensor] = []
+            grads: List[torch.Tensor] = []
             for p in group['params']:
                 if p.grad is None:
                     continue
 
-                grad = p.grad
-                if grad.is_sparse:
+                if p.grad.is_sparse:
                     raise NoSparseGradientError(str(self))
 
-                if p.ndim > 1:  # if not normalization gamma/beta or bias
-                    param_norm = torch.linalg.norm(p)
-                    update_norm = torch.linalg.norm(grad)
+                params.append(p)
+                grads.append(p.grad)
 
-                    one = torch.ones_like(param_norm)
+            if not group['foreach'] or not TORCH_VERSION_AT_LEAST_1_13:
+                for p, grad in zip(params, grads):
+                    self.update_single_tensor(group, p, grad)
+                continue
 
-                    trust_ratio = torch.where(
-                        param_norm > 0.0,
-                        torch.where(update_norm > 0.0, (group['trust_coefficient'] * param_norm / update_norm), one),
-                        one,
+            for (_, _, is_nd), (bucket_params, bucket_grads) in self.group_tensors(params, grads).items():
+                if is_nd:  # if not normalization gamma/beta or bias
+                    self.scale_by_trust_ratio(
+                        bucket_params, bucket_grads, group['weight_decay'], group['trust_coefficient']
                     )
 
-                    grad.add_(p, alpha=group['weight_decay'])
-                    grad.mul_(trust_ratio)
-
+                momentum_buffers: List[torch.Tensor] = []
                 if group['momentum'] > 0.0:
-                    state = self.state[p]
-                    if 'momentum_buffer' not in state:
-                        state['momentum_buffer'] = grad.clone().detach()
+                    for p, grad in zip(bucket_params, bucket_grads):
+                        state = self.state[p]
+                        if 'momentum_buffer' not in state:
+                            state['momentum_buffer'] = grad.clone().detach()
 
-                    mb = state['momentum_buffer']
-                    mb.mul_(group['momentum']).add_(grad, alpha=1.0 - group['dampening'])
+                        momentum_buffers.append(state['momentum_buffer'])
 
-                    if group['nesterov']:
-                        grad.add_(mb, alpha=group['momentum'])
-                    else:
-                        grad.copy_(mb)
+                updates = self.get_momentum_updates(
+                    bucket_grads, momentum_buffers, group['momentum'], group['dampening'], group['nesterov']
+                )
 
-                p.add_(grad, alpha=-group['lr'])
+                # applied outside the compiled function, so a changing learning rate doesn't trigger recompilations
+                torch._foreach_add_(bucket_params, updates, alpha=-group['lr'])
 
         return loss
@@ -332,7 +332,7 @@ class AdaLOMO(BaseOptimizer):
                         self.exp_avg_sq_row[n].mul_(beta2_t).add_(update.mean(dim=-1), alpha=1.0 - beta2_t)
                         self.exp_avg_sq_col[n].mul_(beta2_t).add_(update.mean(dim=-2), alpha=1.0 - beta2_t)
 
-                        self.approximate_sq_grad(self.exp_avg_sq_row[n], self.exp_avg_sq_col[n], update)
+                        update = self.approximate_sq_grad(self.exp_avg_sq_row[n], self.exp_avg_sq_col[n])
                         update.mul_(grad_fp32)
                     else:
                         self.exp_avg_sq[n].mul_(beta2_t).add_(update, alpha=1.0 - beta2_t)
@@ -398,7 +398,7 @@ class AdaLOMO(BaseOptimizer):
                     self.exp_avg_sq_row[n].mul_(beta2_t).add_(update.mean(dim=-1), alpha=1.0 - beta2_t)
                     self.exp_avg_sq_col[n].mul_(beta2_t).add_(update.mean(dim=-2), alpha=1.0 - beta2_t)
 
-                    self.approximate_sq_grad(self.exp_avg_sq_row[n], self.exp_avg_sq_col[n], update)
+                    update = self.approximate_sq_grad(self.exp_avg_sq_row[n], self.exp_avg_sq_col[n])
                     update.mul_(grad_fp32)
                 else:
                     self.exp_avg_sq[n].mul_(beta2_t).add_(update, alpha=1.0 - beta2_t)
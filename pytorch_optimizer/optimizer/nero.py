@@ -1,4 +1,5 @@
-from typing import List
+import math
+from typing import Dict, List, Optional, Tuple
 
 import torch
 
@@ -18,6 +19,37 @@ def neuron_norm(x: torch.Tensor) -> torch.Tensor:
     return channel_view(x).norm(dim=1).view(*view_shape)
 
 
+def neuron_norms(xs: List[torch.Tensor], max_batch_numel: int = 2 ** 16) -> List[torch.Tensor]:  # fmt: skip
+    r"""Get norms of the tensors.
+
+    The small (2D+) tensors sharing the device, dtype and size of the neuron are concatenated, so their norms are
+    computed by a single reduction rather than a launch per tensor. The larger tensors are reduced one by one, not to
+    pay for the copy.
+
+    :param xs: List[torch.Tensor]. tensors.
+    :param max_batch_numel: int. maximum number of the elements of the tensor to be concatenated.
+    """
+    norms: List[Optional[torch.Tensor]] = [None] * len(xs)
+
+    buckets: Dict[Tuple[torch.device, torch.dtype, int], List[int]] = {}
+    for i, x in enumerate(xs):
+        if x.dim() > 1 and 0 < x.numel() <= max_batch_numel:
+            buckets.setdefault((x.device, x.dtype, x.numel() // x.shape[0]), []).append(i)
+        else:
+            norms[i] = neuron_norm(x)
+
+    for indices in buckets.values():
+        if len(indices) == 1:
+            norms[indices[0]] = neuron_norm(xs[indices[0]])
+            continue
+
+        row_norms = torch.cat([channel_view(xs[i]) for i in indices]).norm(dim=1)
+        for i, norm in zip(indices, row_norms.split([xs[i].shape[0] for i in indices])):
+            norms[i] = norm.view(xs[i].shape[0], *([1] * (xs[i].dim() - 1)))
+
+    return norms
+
+
 def neuron_mean(x: torch.Tensor) -> torch.Tensor:
     r"""Get mean of the tensor."""
     if x.dim() <= 1:
@@ -28,6 +60,30 @@ def neuron_mean(x: torch.Tensor) -> torch.Tensor:
     return channel_view(x).mean(dim=1).view(*view_shape)
 
 
+def neuron_mean_norm(x: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+    r"""Get mean and norm of the mean-centered tensor in a single pass.
+
+    It is equivalent to `neuron_mean(x)` and `neuron_norm(x - neuron_mean(x))`, but only reads the tensor once.
+    """
+    if x.dim() <= 1:
+        raise ValueError('[-] neuron_mean_norm not defined on 1D tensors.')
+
+    view_shape: List[int] = [x.shape[0]] + [1] * (x.dim() - 1)
+
+    x = channel_view(x)
+
+    var, mean = torch.var_mean(x, dim=1, unbiased=False)
+    norm = var.mul_(x.shape[1]).sqrt_()
+
+    return mean.view(*view_shape), norm.view(*view_shape)
+
+
+def neuron_project_(x: torch.Tensor, eps: float) -> torch.Tensor:
+    r"""Project the tensor to zero-mean and unit-norm per neuron in-place."""
+    mean, norm = neuron_mean_norm(x)
+    return x.sub_(mean).div_(norm.add_(eps))
+
+
 class Nero(BaseOptimizer):
     """Learning by Turning: Neural Architecture Aware Optimisation.
 
@@ -36,6 +92,11 @@ class Nero(BaseOptimizer):
     :param beta: float. coefficients used for computing running averages of gradient and the squared hessian trace.
     :param constraints: bool.
     :param eps: float. term added to the denominator to improve numerical stability.
+    :param foreach: bool. whether to compute the norms of the gradients w/ the batched reduction. if False, they are
+        computed one by one.
+    :param use_compile: bool. whether to `torch.compile` the projection of the constraints to fuse the reduction and
+        the element-wise operations. it takes some time to compile at the first few steps. requires PyTorch 2.0 or
+        later.
     """
 
     def __init__(
@@ -45,13 +106,22 @@ class Nero(BaseOptimizer):
         beta: float = 0.999,
         constraints: bool = True,
         eps: float = 1e-8,
+        foreach: bool = True,
+        use_compile: bool = False,
         **kwargs,
     ):
         self.validate_learning_rate(lr)
         self.validate_range(beta, 'beta', 0.0, 1.0, range_type='[]')
         self.validate_non_negative(eps, 'eps')
 
-        defaults: DEFAULTS = {'lr': lr, 'beta': beta, 'constraints': constraints, 'eps': eps}
+        self.neuron_project_ = neuron_project_
+        if use_compile:
+            if not hasattr(torch, 'compile'):
+                raise ValueError('[-] use_compile requires PyTorch 2.0 or later.')
+
+            self.neuron_project_ = torch.compile(neuron_project_, fullgraph=True)
+
+        defaults: DEFAULTS = {'lr': lr, 'beta': beta, 'constraints': constraints, 'eps': eps, 'foreach': foreach}
         super().__init__(params, defaults)
 
     def __str__(self) -> str:
@@ -62,14 +132,15 @@ class Nero(BaseOptimizer):
         for group in self.param_groups:
             for p in group['params']:
                 if group['constraints'] and p.dim() > 1:
-                    p.sub_(neuron_mean(p))
-                    p.div_(neuron_norm(p) + group['eps'])
+                    self.neuron_project_(p, group['eps'])
 
                 state = self.state[p]
 
+                norm = neuron_norm(p)
+
                 state['step'] = 0
-                state['exp_avg_sq'] = torch.zeros_like(neuron_norm(p))
-                state['scale'] = neuron_norm(p).mean()
+                self.zero_state(state, 'exp_avg_sq', norm.shape, norm.dtype, norm.device)
+                state['scale'] = norm.mean()
 
                 if state['scale'] == 0.0:
                     state['scale'] = 0.01
@@ -82,42 +153,51 @@ class Nero(BaseOptimizer):
                 loss = closure()
 
         for group in self.param_groups:
+            params: List[torch.Tensor] = []
+            grads: List[torch.Tensor] = []
             for p in group['params']:
                 if p.grad is None:
                     continue
 
-                grad = p.grad
-                if grad.is_sparse:
+                if p.grad.is_sparse:
                     raise NoSparseGradientError(str(self))
 
+                params.append(p)
+                grads.append(p.grad)
+
+            grad_norms: List[torch.Tensor] = (
+                neuron_norms(grads) if group['foreach'] else [neuron_norm(grad) for grad in grads]
+            )
+
+            for p, grad, grad_norm in zip(params, grads, grad_norms):
                 state = self.state[p]
                 if len(state) == 0:
                     if group['constraints'] and p.dim() > 1:
-                        p.sub_(neuron_mean(p))
-                        p.div_(neuron_norm(p) + group['eps'])
+                        self.neuron_project_(p, group['eps'])
+
+                    norm = neuron_norm(p)
 
                     state['step'] = 0
-                    state['exp_avg_sq'] = torch.zeros_like(neuron_norm(p))
-                    state['scale'] = neuron_norm(p).mean()
+                    state['exp_avg_sq'] = torch.zeros_like(norm)
+                    state['scale'] = norm.mean()
                     if state['scale'] == 0.0:
                         state['scale'] = 0.01
 
                 state['step'] += 1
 
-                grad_norm = neuron_norm(grad)
-
                 exp_avg_sq = state['exp_avg_sq']
                 exp_avg_sq.mul_(group['beta']).addcmul_(grad_norm, grad_norm, value=1.0 - group['beta'])
 
-                bias_correction: float = 1.0 - group['beta'] ** state['step']
+                # fold the bias correction into the step size
+                # sqrt(v / bc) + eps = (sqrt(v) + eps * sqrt(bc)) / sqrt(bc)
+                bias_correction_sq: float = math.sqrt(self.debias(group['beta'], state['step']))
 
-                grad_normed = grad / ((exp_avg_sq / bias_correction).sqrt_().add_(group['eps']))
+                grad_normed = grad / exp_avg_sq.sqrt().add_(group['eps'] * bias_correction_sq)
                 torch.nan_to_num(grad_normed, nan=0.0, out=grad_normed)
 
-                p.sub_(grad_normed, alpha=group['lr'] * state['scale'])
+                p.sub_(grad_normed, alpha=group['lr'] * state['scale'] * bias_correction_sq)
 
                 if group['constraints'] and p.dim() > 1:
-                    p.sub_(neuron_mean(p))
-                    p.div_(neuron_norm(p) + group['eps'])
+                    self.neuron_project_(p, group['eps'])
 
         return loss
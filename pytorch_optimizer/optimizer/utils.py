@@ -33,6 +33,7 @@ def compare_versions(v1: str, v2: str) -> bool:
 
 
 HAS_TRANSFORMERS: bool = find_spec('transformers') is not None
+TORCH_VERSION_AT_LEAST_1_13: bool = compare_versions(torch.__version__, '1.13.0')
 TORCH_VERSION_AT_LEAST_2_4: bool = compare_versions(torch.__version__, '2.4.0')
 
 if HAS_TRANSFORMERS:  # pragma: no cover
@@ -1,4 +1,6 @@
-from typing import Any, Dict, List, Tuple, Union
+from typing import Any, Dict, FrozenSet, List, Tuple, Union
+
+import torch
 
 from pytorch_optimizer.optimizer import (
     ADOPT,
@@ -82,8 +84,8 @@ DECOUPLE_FLAGS: List[bool] = [True, False]
 ADAPTIVE_FLAGS: List[bool] = [True, False]
 PULLBACK_MOMENTUM: List[str] = ['none', 'reset', 'pullback']
 
-VALID_OPTIMIZER_NAMES: List[str] = list(OPTIMIZERS.keys())
-INVALID_OPTIMIZER_NAMES: List[str] = [
+VALID_OPTIMIZER_NAMES: Tuple[str, ...] = tuple(OPTIMIZERS)
+INVALID_OPTIMIZER_NAMES: Tuple[str, ...] = (
     'asam',
     'sam',
     'gsam',
@@ -91,11 +93,12 @@ INVALID_OPTIMIZER_NAMES: List[str] = [
     'pcgrad',
     'lookahead',
     'trac',
-]
+)
 
 SPARSE_OPTIMIZERS: List[str] = ['madgrad', 'dadaptadagrad', 'sm3']
+SPARSE_OPTIMIZERS_SET: FrozenSet[str] = frozenset(SPARSE_OPTIMIZERS)
 NO_SPARSE_OPTIMIZERS: List[str] = [
-    optimizer for optimizer in VALID_OPTIMIZER_NAMES if optimizer not in SPARSE_OPTIMIZERS
+    optimizer for optimizer in VALID_OPTIMIZER_NAMES if optimizer not in SPARSE_OPTIMIZERS_SET
 ]
 
 BETA_OPTIMIZER_NAMES: List[str] = [
@@ -198,6 +201,8 @@ OPTIMIZERS: List[Tuple[Any, Dict[str, Union[float, bool, int]], int]] = [
     (Lamb, {'lr': 5e-1, 'weight_decay': 1e-3, 'rectify': True, 'degenerated_to_sgd': True}, 5),
     (LARS, {'lr': 5e-1, 'weight_decay': 1e-3}, 20),
     (LARS, {'lr': 5e-1, 'nesterov': True}, 20),
+    (LARS, {'lr': 5e-1, 'nesterov': True, 'foreach': False}, 20),
+    (LARS, {'lr': 5e-1, 'weight_decay': 1e-3, 'use_compile': True}, 20),
     (MADGRAD, {'lr': 5e-1, 'weight_decay': 1e-3}, 10),
     (MADGRAD, {'lr': 5e-1, 'weight_decay': 1e-3, 'eps': 0.0}, 10),
     (MADGRAD, {'lr': 1e-1, 'weight_decay': 1e-3, 'momentum': 0.0}, 10),
@@ -360,6 +365,7 @@ OPTIMIZERS: List[Tuple[Any, Dict[str, Union[float, bool, int]], int]] = [
     (AdaPNM, {'lr': 5e-1, 'weight_decay': 1e-3, 'ams_bound': False}, 10),
     (Nero, {'lr': 5e-1}, 25),
     (Nero, {'lr': 5e0, 'constraints': False}, 5),
+    (Nero, {'lr': 5e0, 'constraints': False, 'foreach': False}, 5),
     (Adan, {'lr': 5e-1}, 5),
     (Adan, {'lr': 5e-1, 'max_grad_norm': 1.0}, 5),
     (Adan, {'lr': 5e-1, 'weight_decay': 1e-3, 'use_gc': True}, 5),
@@ -374,9 +380,12 @@ OPTIMIZERS: List[Tuple[Any, Dict[str, Union[float, bool, int]], int]] = [
     (AdamS, {'lr': 1e0, 'weight_decay': 1e-3}, 10),
     (AdamS, {'lr': 1e0, 'weight_decay': 1e-3, 'ams_bound': True}, 20),
     (AdaFactor, {'lr': 1e1, 'weight_decay': 1e-3, 'scale_parameter': False}, 100),
+    (AdaFactor, {'lr': 1e1, 'weight_decay': 1e-3, 'scale_parameter': False, 'momentum_dtype': torch.float32}, 100),
     (AdaFactor, {'lr': 1e1, 'weight_decay': 1e-3, 'ams_bound': True}, 120),
     (AdaFactor, {'lr': 1e1, 'weight_decay': 1e-3, 'cautious': True}, 70),
     (AdaFactor, {'lr': 1e1, 'betas': (None, 0.999), 'weight_decay': 1e-3}, 40),
+    (AdaFactor, {'lr': 1e1, 'weight_decay': 1e-3, 'ams_bound': True, 'use_compile': True}, 120),
+    (AdaFactor, {'lr': 1e1, 'weight_decay': 1e-3, 'cautious': True, 'foreach': False}, 70),
     (Apollo, {'lr': 5e-1, 'weight_decay': 1e-3}, 10),
     (Apollo, {'lr': 5e-1, 'weight_decay': 1e-3, 'rebound': 'belief'}, 10),
     (Apollo, {'lr': 5e-1, 'weight_decay': 1e-3, 'weight_decay_type': 'stable', 'warmup_steps': 0}, 50),
@@ -471,6 +471,152 @@ def test_reset(optimizer_config):
     optimizer.reset()
 
 
+@pytest.mark.parametrize(('optimizer_name', 'state_name'), [('AdaFactor', 'exp_avg_sq_row'), ('Nero', 'exp_avg_sq')])
+def test_reset_reuses_state(optimizer_name, state_name):
+    param = simple_parameter()
+
+    optimizer = load_optimizer(optimizer_name)([param])
+    optimizer.reset()
+
+    state = optimizer.state[param][state_name]
+    state.fill_(1.0)
+
+    optimizer.reset()
+
+    assert optimizer.state[param][state_name] is state
+    assert torch.count_nonzero(state) == 0
+
+
+def test_lars_without_foreach_norm(monkeypatch):
+    def train(foreach_norm: bool) -> torch.Tensor:
+        monkeypatch.setattr('pytorch_optimizer.optimizer.lars.TORCH_VERSION_AT_LEAST_1_13', foreach_norm)
+
+        (x_data, y_data), model, loss_fn = build_environment()
+
+        optimizer = load_optimizer('lars')(model.parameters(), lr=5e-1, weight_decay=1e-3)
+        for _ in range(5):
+            optimizer.zero_grad()
+            loss_fn(model(x_data), y_data).backward()
+            optimizer.step()
+
+        return torch.cat([p.detach().view(-1) for p in model.parameters()])
+
+    torch.testing.assert_close(train(foreach_norm=False), train(foreach_norm=True))
+
+
+@pytest.mark.parametrize(
+    ('optimizer_name', 'message'),
+    [
+        ('LARS', '[-] run step() before capture_step() to initialize the momentum buffers.'),
+        ('AdaFactor', '[-] run step() before capture_step() to initialize the states.'),
+    ],
+)
+def test_capture_step_before_step(optimizer_name, message):
+    param = simple_parameter()
+
+    optimizer = load_optimizer(optimizer_name)([param])
+
+    with pytest.raises(ValueError) as error_info:
+        optimizer.capture_step()
+
+    assert str(error_info.value) == message
+    assert optimizer.cuda_graph is None
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason='requires CUDA')
+@pytest.mark.parametrize('optimizer_name', ['LARS', 'AdaFactor'])
+def test_capture_step(optimizer_name):
+    torch.manual_seed(42)
+
+    params = [torch.randn(4, 3, device='cuda'), torch.randn(3, device='cuda')]
+
+    eager_params = [p.clone().requires_grad_(True) for p in params]
+    graph_params = [p.clone().requires_grad_(True) for p in params]
+    for p in eager_params + graph_params:
+        p.grad = torch.zeros_like(p)
+
+    eager_optimizer = load_optimizer(optimizer_name)(eager_params, lr=1e-1)
+    graph_optimizer = load_optimizer(optimizer_name)(graph_params, lr=1e-1)
+
+    def step() -> None:
+        for eager_p, graph_p in zip(eager_params, graph_params):
+            grad = torch.randn_like(eager_p)
+            eager_p.grad.copy_(grad)
+            graph_p.grad.copy_(grad)
+
+        eager_optimizer.step()
+        graph_optimizer.step()
+
+    for _ in range(3):
+        step()
+
+    graph_optimizer.capture_step()
+    assert graph_optimizer.cuda_graph is not None
+
+    for _ in range(5):
+        step()
+
+    torch.testing.assert_close(graph_params, eager_params, rtol=1e-5, atol=1e-6)
+
+    eager_optimizer.reset()
+    graph_optimizer.reset()
+
+    for _ in range(3):
+        step()
+
+    torch.testing.assert_close(graph_params, eager_params, rtol=1e-5, atol=1e-6)
+
+
+def test_nero_compile():
+    torch.manual_seed(42)
+
+    params = [torch.randn(4, 3), torch.randn(3), torch.randn(2, 3, 2)]
+
+    eager_params = [p.clone().requires_grad_(True) for p in params]
+    compiled_params = [p.clone().requires_grad_(True) for p in params]
+
+    eager_optimizer = load_optimizer('nero')(eager_params, lr=1e-1, constraints=True)
+    compiled_optimizer = load_optimizer('nero')(compiled_params, lr=1e-1, constraints=True, use_compile=True)
+
+    for _ in range(30):
+        for eager_p, compiled_p in zip(eager_params, compiled_params):
+            eager_p.grad = torch.randn_like(eager_p)
+            compiled_p.grad = eager_p.grad.clone()
+
+        eager_optimizer.step()
+        compiled_optimizer.step()
+
+    torch.testing.assert_close(compiled_params, eager_params, rtol=1e-5, atol=1e-6)
+
+
+def test_lars_compile_with_lr_schedule():
+    torch.manual_seed(42)
+
+    params = [torch.randn(4, 3), torch.randn(3), torch.randn(2, 3, 2)]
+
+    eager_params = [p.clone().requires_grad_(True) for p in params]
+    compiled_params = [p.clone().requires_grad_(True) for p in params]
+
+    eager_optimizer = load_optimizer('lars')(eager_params, lr=1e-1, weight_decay=1e-3, momentum=0.9)
+    compiled_optimizer = load_optimizer('lars')(
+        compiled_params, lr=1e-1, weight_decay=1e-3, momentum=0.9, use_compile=True
+    )
+
+    # more distinct learning rates than the default recompile limit (8)
+    for step in range(12):
+        for optimizer in (eager_optimizer, compiled_optimizer):
+            optimizer.param_groups[0]['lr'] = 1e-1 / (step + 1)
+
+        for eager_p, compiled_p in zip(eager_params, compiled_params):
+            eager_p.grad = torch.randn_like(eager_p)
+            compiled_p.grad = eager_p.grad.clone()
+
+        eager_optimizer.step()
+        compiled_optimizer.step()
+
+    torch.testing.assert_close(compiled_params, eager_params, rtol=1e-5, atol=1e-6)
+
+
 @pytest.mark.parametrize('require_gradient', [False, True])
 @pytest.mark.parametrize('sparse_gradient', [False, True])
 @pytest.mark.parametrize('optimizer_name', ['DAdaptAdaGrad', 'DAdaptAdam', 'DAdaptSGD', 'DAdaptAdan', 'DAdaptLion'])
@@ -6,7 +6,7 @@ import torch
 from torch import nn
 
 from pytorch_optimizer.optimizer import get_optimizer_parameters
-from pytorch_optimizer.optimizer.nero import neuron_mean, neuron_norm
+from pytorch_optimizer.optimizer.nero import neuron_mean, neuron_mean_norm, neuron_norm, neuron_norms
 from pytorch_optimizer.optimizer.shampoo_utils import (
     BlockPartitioner,
     PreConditioner,
@@ -30,6 +30,16 @@ from pytorch_optimizer.optimizer.utils import (
 )
 from tests.utils import Example
 
+NORMALIZED_GRADIENT: torch.Tensor = torch.tensor(
+    [0.0000, 0.3303, 0.6606, 0.9909, 1.3212, 1.6514, 1.9817, 2.3120, 2.6423, 2.9726], dtype=torch.float32
+)
+ARANGE_NORM: float = 16.88194
+
+
+@pytest.fixture(scope='module')
+def arange():
+    return torch.arange(0, 10, dtype=torch.float32)
+
 
 def test_has_overflow():
     assert has_overflow(torch.tensor(torch.inf))
@@ -38,43 +48,33 @@ def test_has_overflow():
     assert not has_overflow(torch.Tensor([1]))
 
 
-def test_normalized_gradient():
-    x = torch.arange(0, 10, dtype=torch.float32)
+def test_normalized_gradient(arange):
+    x = arange.clone()
     normalize_gradient(x)
 
-    np.testing.assert_allclose(
-        x.numpy(),
-        np.asarray([0.0000, 0.3303, 0.6606, 0.9909, 1.3212, 1.6514, 1.9817, 2.3120, 2.6423, 2.9726]),
-        rtol=1e-4,
-        atol=1e-4,
-    )
+    torch.testing.assert_close(x, NORMALIZED_GRADIENT, rtol=1e-4, atol=1e-4)
 
-    x = torch.arange(0, 10, dtype=torch.float32)
+    x = arange.clone()
     normalize_gradient(x.view(1, 10), use_channels=True)
 
-    np.testing.assert_allclose(
-        x.numpy(),
-        np.asarray([0.0000, 0.3303, 0.6606, 0.9909, 1.3212, 1.6514, 1.9817, 2.3120, 2.6423, 2.9726]),
-        rtol=1e-4,
-        atol=1e-4,
-    )
+    torch.testing.assert_close(x, NORMALIZED_GRADIENT, rtol=1e-4, atol=1e-4)
+
 
+def test_clip_grad_norm(arange):
+    x = arange.clone().requires_grad_(True)
+    x.grad = x.detach().clone()
 
-def test_clip_grad_norm():
-    x = torch.arange(0, 10, dtype=torch.float32, requires_grad=True)
-    x.grad = torch.arange(0, 10, dtype=torch.float32)
+    np.testing.assert_approx_equal(clip_grad_norm(x), ARANGE_NORM, significant=6)
+    np.testing.assert_approx_equal(clip_grad_norm(x, max_norm=2), ARANGE_NORM, significant=6)
 
-    np.testing.assert_approx_equal(clip_grad_norm(x), 16.88194, significant=6)
-    np.testing.assert_approx_equal(clip_grad_norm(x, max_norm=2), 16.88194, significant=6)
 
+def test_unit_norm(arange):
+    x = arange
 
-def test_unit_norm():
-    x = torch.arange(0, 10, dtype=torch.float32)
+    shapes = [(10,), (1, 10), (1, 10, 1, 1), (1, 10, 1, 1, 1, 1)]
+    norms = torch.stack([unit_norm(x.view(shape)).reshape(-1)[0] for shape in shapes])
 
-    np.testing.assert_approx_equal(unit_norm(x).numpy(), 16.8819, significant=5)
-    np.testing.assert_approx_equal(unit_norm(x.view(1, 10)).numpy().reshape(-1)[0], 16.8819, significant=5)
-    np.testing.assert_approx_equal(unit_norm(x.view(1, 10, 1, 1)).numpy().reshape(-1)[0], 16.8819, significant=5)
-    np.testing.assert_approx_equal(unit_norm(x.view(1, 10, 1, 1, 1, 1)).numpy().reshape(-1)[0], 16.8819, significant=5)
+    torch.testing.assert_close(norms, torch.full((len(shapes),), ARANGE_NORM), rtol=1e-5, atol=1e-5)
 
 
 def test_neuron_mean_norm():
@@ -97,6 +97,24 @@ def test_neuron_mean_norm():
         np.asarray([[5.0], [4.0], [3.0], [2.0], [1.0], [0.0], [1.0], [2.0], [3.0], [4.0]]),
     )
 
+    with pytest.raises(ValueError) as error_info:
+        neuron_mean_norm(x)
+
+    assert str(error_info.value) == '[-] neuron_mean_norm not defined on 1D tensors.'
+
+    x = x.view(2, 5)
+    mean, norm = neuron_mean_norm(x)
+
+    np.testing.assert_allclose(mean.numpy(), neuron_mean(x).numpy())
+    np.testing.assert_allclose(norm.numpy(), neuron_norm(x - neuron_mean(x)).numpy(), rtol=1e-6)
+
+
+def test_neuron_norms():
+    xs = [torch.randn(3, 4), torch.randn(5), torch.randn(2, 2, 2), torch.randn(6, 4), torch.randn(300, 300)]
+
+    for norm, x in zip(neuron_norms(xs), xs):
+        np.testing.assert_allclose(norm.numpy(), neuron_norm(x).numpy(), rtol=1e-6)
+
 
 def test_get_optimizer_parameters():
     model: nn.Module = Example()
@@ -109,7 +127,7 @@ def test_get_optimizer_parameters():
 
     for before, after in zip(before_parameters, after_parameters):
         layer_name: str = before[0]
-        if layer_name.find('bias') != -1 or layer_name.find('LayerNorm') != -1:
+        if 'bias' in layer_name or 'LayerNorm' in layer_name:
             assert after['weight_decay'] == 0.0
 
 